@@ -138,6 +138,14 @@ class CryptoTradeSimulator {
             return;
         }
 
+        // Proxy batches exchange messages into an array; only the latest book matters
+        if (Array.isArray(parsed)) {
+            if (parsed.length === 0) {
+                return;
+            }
+            parsed = parsed[parsed.length - 1];
+        }
+
         let midPrice = null;
 
         // Parse Binance order book data (depth5@100ms)
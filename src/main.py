@@ -1,9 +1,43 @@
 import sys
 import queue
 from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import Qt, QObject, pyqtSignal
 from websocket_client import WebSocketClient
 from models import TradeSimulator
-from ui import TradeSimulatorUI
+from ui import TradeSimulatorUI, prepare_snapshot
+from config import DEFAULT_QUANTITY
+
+class SimulatorBridge(QObject):
+    """Computes metrics after each orderbook update and pushes them to the UI"""
+    metrics_ready = pyqtSignal(object)  # ui.UiSnapshot
+    
+    def __init__(self, simulator):
+        super().__init__()
+        self.simulator = simulator
+        self.params = (DEFAULT_QUANTITY, 'buy', 0.5)
+        self.paused = False
+        
+    def set_params(self, quantity, side, volatility_sens):
+        """Set order parameters and have the consumer push fresh metrics for them"""
+        self.params = (quantity, side, volatility_sens)
+        self.simulator.request_update()
+        
+    def set_paused(self, paused):
+        """Skip computing metrics while the UI can't display them"""
+        was_paused, self.paused = self.paused, paused
+        if was_paused and not paused:
+            # Metrics were not computed while paused, push fresh ones now
+            self.simulator.request_update()
+        
+    def publish(self):
+        """Runs on the simulator's consumer thread, Qt queues the signal to the GUI thread"""
+        # The metrics dict is reused by the simulator, it is only read here before the next call
+        if self.paused:
+            return
+        metrics = self.simulator.calculate_all_metrics(*self.params)
+        if metrics:
+            # Formatting happens here so the GUI thread only calls setters
+            self.metrics_ready.emit(prepare_snapshot(metrics))
 
 def main():
     # Initialize WebSocket client
@@ -12,23 +46,28 @@ def main():
     
     # Initialize trade simulator
     simulator = TradeSimulator()
+    bridge = SimulatorBridge(simulator)
     
     # Create Qt application
     app = QApplication(sys.argv)
     
-    # Connect WebSocket message signal to update orderbook
-    def handle_ws_message(message):
-        simulator.update_orderbook(message)
-    ws_client.message_received.connect(handle_ws_message)
+    # Drain queued WebSocket messages and hand the newest snapshot to the simulator's consumer thread.
+    # Direct connection runs this on the WebSocket thread, keeping the GUI event loop off the data path.
+    def handle_ws_batch():
+        messages = ws_client.drain()
+        if messages:
+            simulator.submit_orderbook(messages[-1])
+    ws_client.batch_ready.connect(handle_ws_batch, Qt.DirectConnection)
     
+    simulator.start(on_update=bridge.publish)
     ws_client.connect()
     
-    def get_simulation_data(quantity, side, volatility_sens):
-        # Currently volatility_sens is unused, but accepted for compatibility
-        return simulator.calculate_all_metrics(quantity, side)
-        
+    # Stop the feed first so nothing is queued while the consumer shuts down
+    app.aboutToQuit.connect(ws_client.disconnect)
+    app.aboutToQuit.connect(simulator.stop)
+    
     # Create and show UI
-    ui = TradeSimulatorUI(get_simulation_data)
+    ui = TradeSimulatorUI(bridge)
     ui.show()
     
     # Start application loop
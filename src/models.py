@@ -1,44 +1,137 @@
 import numpy as np
 from scipy.stats import linregress, norm
-from sklearn.linear_model import LogisticRegression
-from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
-from sklearn.preprocessing import StandardScaler
+from sklearn.linear_model import LogisticRegression, SGDRegressor
+from sklearn.preprocessing import StandardScaler, FunctionTransformer
 from sklearn.pipeline import make_pipeline
+from sklearn.base import clone
+from sklearn.exceptions import ConvergenceWarning
+import math
+import orjson
+import queue
+import threading
 import time
-from collections import deque
-from numba import jit
+from bisect import bisect_left, insort
+from collections import deque, namedtuple
+from optimizations import OptimizedCalculations, SQRT_ANNUAL
+from utils import logger
 import warnings
 warnings.filterwarnings('ignore', category=UserWarning)
+warnings.filterwarnings('ignore', category=ConvergenceWarning)
+# penalty='elasticnet' is deprecated in newer scikit-learn but still required by older releases
+warnings.filterwarnings('ignore', category=FutureWarning, module='sklearn')
+
+BOOK_DEPTH = 64  # Max levels parsed per side
+HISTORY_SIZE = 2000  # Snapshots kept in the history ring
+HISTORY_LEVELS = 20  # Levels per side kept in history, deepest any feature reads
+
+# Column layout of a history row: [ask_px, ask_qty, bid_px, bid_qty] x HISTORY_LEVELS
+ASK_PX = slice(0, HISTORY_LEVELS)
+ASK_QTY = slice(HISTORY_LEVELS, 2 * HISTORY_LEVELS)
+BID_PX = slice(2 * HISTORY_LEVELS, 3 * HISTORY_LEVELS)
+BID_QTY = slice(3 * HISTORY_LEVELS, 4 * HISTORY_LEVELS)
+VOL_WINDOWS = (20, 30)  # Volatility windows maintained incrementally
+SCALER_FREEZE_SAMPLES = 500  # Feature scaling is frozen once fit on this many rows
+
+# Inbox marker asking the consumer to rerun on_update without a new book
+_REPUBLISH = object()
+
+# History snapshot: ring row plus per-field float32 views of that row (SoA)
+BookSnapshot = namedtuple('BookSnapshot', ['row', 'asks_px', 'asks_qty', 'bids_px', 'bids_qty'])
+
+def _standardize(X, mu, sigma):
+    """Fixed-parameter standard scaling used once a scaler is frozen"""
+    return (X - mu) / sigma
+
+def _parse_levels(levels):
+    """Parse up to BOOK_DEPTH [price, qty, ...] string levels into an (n, 2) float64 array"""
+    parsed = np.array([level[:2] for level in levels[:BOOK_DEPTH]], dtype=np.float64)
+    if parsed.ndim != 2 or parsed.shape[1] != 2:
+        raise ValueError("orderbook levels must be [price, qty, ...]")
+    return parsed
+
+def _store_levels(parsed, px_buf, qty_buf):
+    """Copy parsed levels into preallocated buffers, return level count"""
+    n = len(parsed)
+    px_buf[:n] = parsed[:, 0]
+    qty_buf[:n] = parsed[:, 1]
+    return n
 
 class TradeSimulator:
     def __init__(self):
         self.last_orderbook = None
-        self.historical_data = deque(maxlen=2000)  # Increased history
+        self._lock = threading.RLock()  # Guards simulator state between consumer and readers
+        self._inbox = queue.SimpleQueue()  # Raw orderbooks waiting for the consumer thread
+        self._consumer = None
+        self._on_update = None  # Called on the consumer thread after each accepted book
+        # History ring of parsed books, one compact float32 row per snapshot
+        # (zero-padded past book depth); prices needing precision are kept below
+        self.hist = np.zeros((HISTORY_SIZE, 4 * HISTORY_LEVELS), dtype=np.float32)
+        # Per-snapshot derived scalars in float64, columnar and indexed like the book rows
+        self.best_ask_hist = np.zeros(HISTORY_SIZE, dtype=np.float64)
+        self.mid_hist = np.zeros(HISTORY_SIZE, dtype=np.float64)
+        self.log_mid_hist = np.zeros(HISTORY_SIZE, dtype=np.float64)
+        self.spread_hist = np.zeros(HISTORY_SIZE, dtype=np.float64)
+        self.volume_hist = np.zeros(HISTORY_SIZE, dtype=np.float64)  # Top-5 qty, both sides
+        self.hist_head = 0  # Next row to write
+        self.hist_count = 0  # Valid rows in the ring
+        self.update_count = 0  # Total accepted snapshots
+        # Running sums of log-returns per volatility window
+        self._ret_sum = dict.fromkeys(VOL_WINDOWS, 0.0)
+        self._ret_sum_sq = dict.fromkeys(VOL_WINDOWS, 0.0)
+        self.asks_px = np.empty(BOOK_DEPTH, dtype=np.float64)
+        self.asks_qty = np.empty(BOOK_DEPTH, dtype=np.float64)
+        self.bids_px = np.empty(BOOK_DEPTH, dtype=np.float64)
+        self.bids_qty = np.empty(BOOK_DEPTH, dtype=np.float64)
+        self.n_asks = 0
+        self.n_bids = 0
         self.volatility_window = 50  # Longer lookback for volatility
         self.fee_tiers = {
             'taker': {1: 0.0010, 2: 0.0008, 3: 0.0005},  # Tiered fee structure
             'maker': {1: 0.0008, 2: 0.0006, 3: 0.0004}
         }
         self.processing_times = deque(maxlen=500)
+        self._sorted_processing_times = []  # Same window kept sorted for the median
         self.update_frequencies = deque(maxlen=500)
+        self._update_frequency_sum = 0.0
         self.last_update_time = time.time()
         self.slippage_model = self._init_slippage_model()
+        self._slip_fitted = False
+        # Cached linear parameters for the online predict path (predicts 0 until fitted)
+        self._slip_w = np.zeros(5)
+        self._slip_b = 0.0
+        self._slip_mu = np.zeros(5)
+        self._slip_sigma = np.ones(5)
         self.maker_taker_model = self._init_maker_taker_model()
+        self._mt_x = np.empty((1, 4))  # Reused maker/taker model input row
         self.scaler = StandardScaler()
         self.last_volatility = 0
         self.last_impact = 0
+        self._cache = {}  # Metrics of the latest snapshot, rebuilt by update_orderbook
+        self._cache_id = -1  # update_count the cache was built for
+        # Metrics returned by calculate_all_metrics, updated in place every call
+        self._metrics = {
+            'mid_price': 0.0,
+            'slippage': 0.0,
+            'fees': 0.0,
+            'market_impact': 0.0,
+            'net_cost': 0.0,
+            'maker_taker_proportion': (0.7, 0.3),
+            'processing_time': 0.0,
+            'avg_processing_time': 0.0,
+            'update_frequency': 0.0,
+            'orderbook_depth': 0,
+            'volatility': 0.0,
+            'liquidity': 0.0
+        }
         
     def _init_slippage_model(self):
-        """Initialize ensemble model for slippage with better configuration"""
+        """Initialize incrementally-fit linear model for slippage"""
         return make_pipeline(
             StandardScaler(),
-            HistGradientBoostingRegressor(
-                loss='quantile',
-                quantile=0.5,
-                max_iter=200,
-                max_depth=5,
-                learning_rate=0.05,
-                min_samples_leaf=20
+            SGDRegressor(
+                loss='huber',
+                penalty='l2',
+                learning_rate='adaptive'
             )
         )
         
@@ -55,26 +148,180 @@ class TradeSimulator:
             )
         )
 
+    def start(self, on_update=None):
+        """Start the background consumer that applies submitted orderbooks"""
+        self._on_update = on_update
+        if self._consumer is None:
+            self._consumer = threading.Thread(target=self._consume, daemon=True)
+            self._consumer.start()
+            
+    def stop(self):
+        """Stop the background consumer, orderbooks still queued are discarded"""
+        if self._consumer is not None:
+            self._inbox.put(None)
+            self._consumer.join()
+            self._consumer = None
+            
+    def submit_orderbook(self, orderbook):
+        """Queue an orderbook dict or raw JSON payload for the consumer thread without blocking the caller"""
+        self._inbox.put(orderbook)
+        
+    def request_update(self):
+        """Have the consumer rerun the on_update hook, e.g. after order parameters change"""
+        self._inbox.put(_REPUBLISH)
+        
+    def _consume(self):
+        """Consumer loop: validate, parse and retrain off the WebSocket thread"""
+        while True:
+            # Skip to the newest queued snapshot, older ones are already stale
+            item = self._inbox.get()
+            orderbook, republish = None, False
+            while True:
+                if item is None:
+                    return
+                if item is _REPUBLISH:
+                    republish = True
+                else:
+                    orderbook = item
+                if self._inbox.empty():
+                    break
+                item = self._inbox.get_nowait()
+            # One bad book or failed fit must not end the thread, nothing would update after it
+            try:
+                previous_count = self.update_count
+                if orderbook is not None:
+                    self.update_orderbook(orderbook)
+                if self._on_update is not None and (republish or self.update_count != previous_count):
+                    self._on_update()
+            except Exception:
+                logger.exception("Error processing orderbook")
+            
     def update_orderbook(self, orderbook):
         """Enhanced orderbook update with model retraining logic"""
+        if isinstance(orderbook, (bytes, str)):
+            # Raw payloads are decoded here so skipped snapshots are never parsed
+            try:
+                orderbook = orjson.loads(orderbook)
+            except orjson.JSONDecodeError:
+                return
+        with self._lock:
+            retrain = self._apply_orderbook(orderbook)
+        # Train outside the lock so metric reads are not stalled by model fits
+        if retrain:
+            self._train_models()
+            
+    def _apply_orderbook(self, orderbook):
+        """Store a new orderbook, return whether models are due for retraining"""
         current_time = time.time()
         if self.last_orderbook:
-            self.update_frequencies.append(current_time - self.last_update_time)
+            self._record_update_interval(current_time - self.last_update_time)
         self.last_update_time = current_time
 
         # Validate orderbook structure
         if not self._validate_orderbook(orderbook):
-            return
+            return False
+
+        # Parse once into SoA buffers; all helpers read these arrays
+        # Both sides parse before either buffer is touched, a rejected book leaves them intact
+        try:
+            asks = _parse_levels(orderbook['asks'])
+            bids = _parse_levels(orderbook['bids'])
+        except (ValueError, IndexError, TypeError):
+            return False
+        self.n_asks = _store_levels(asks, self.asks_px, self.asks_qty)
+        self.n_bids = _store_levels(bids, self.bids_px, self.bids_qty)
 
         self.last_orderbook = orderbook
-        self.historical_data.append(orderbook)
+        self._append_history()
+        self._refresh_cache()
         
         # Adaptive model retraining
-        if len(self.historical_data) % 50 == 0:  # More frequent retraining
-            self._train_models()
+        return self.update_count % 50 == 0  # More frequent retraining
+            
+    def _append_history(self):
+        """Copy the parsed book into the next history ring row"""
+        row = self.hist_head
+        hist_row = self.hist[row]
+        n_asks = min(self.n_asks, HISTORY_LEVELS)
+        n_bids = min(self.n_bids, HISTORY_LEVELS)
+        hist_row[:] = 0
+        hist_row[ASK_PX.start:ASK_PX.start + n_asks] = self.asks_px[:n_asks]
+        hist_row[ASK_QTY.start:ASK_QTY.start + n_asks] = self.asks_qty[:n_asks]
+        hist_row[BID_PX.start:BID_PX.start + n_bids] = self.bids_px[:n_bids]
+        hist_row[BID_QTY.start:BID_QTY.start + n_bids] = self.bids_qty[:n_bids]
+            
+        # Python floats and math for the scalar work, NumPy scalars are slower here
+        best_ask, best_bid = float(self.asks_px[0]), float(self.bids_px[0])
+        mid = (best_ask + best_bid) / 2 if best_ask > 0 and best_bid > 0 else 0.0
+        self.best_ask_hist[row] = best_ask
+        self.mid_hist[row] = mid
+        self.log_mid_hist[row] = math.log(mid) if mid > 0 else math.nan
+        self.spread_hist[row] = (best_ask - best_bid) / mid if mid > 0 else 0.0
+        self.volume_hist[row] = self.asks_qty[:min(self.n_asks, 5)].sum() + self.bids_qty[:min(self.n_bids, 5)].sum()
+        self.hist_head = (row + 1) % HISTORY_SIZE
+        self.hist_count = min(self.hist_count + 1, HISTORY_SIZE)
+        self.update_count += 1
+        self._update_return_sums()
+        
+    def _update_return_sums(self):
+        """Slide each volatility window by one log-return in O(1)"""
+        if self.update_count % HISTORY_SIZE == 0:
+            # Periodically rebuild from the ring to shed accumulated rounding error
+            for window in VOL_WINDOWS:
+                log_returns = np.diff(self.log_mid_hist[self._history_index(window)])
+                self._ret_sum[window] = float(log_returns.sum())
+                self._ret_sum_sq[window] = float(log_returns @ log_returns)
+            return
+        if self.hist_count < 2:
+            return
+            
+        head = self.hist_head
+        log_mid = self.log_mid_hist
+        r_new = log_mid[(head - 1) % HISTORY_SIZE] - log_mid[(head - 2) % HISTORY_SIZE]
+        for window in VOL_WINDOWS:
+            s = self._ret_sum[window] + r_new
+            s_sq = self._ret_sum_sq[window] + r_new * r_new
+            if self.hist_count > window:
+                # Evict the return that just left the window
+                r_old = log_mid[(head - window) % HISTORY_SIZE] - log_mid[(head - window - 1) % HISTORY_SIZE]
+                s -= r_old
+                s_sq -= r_old * r_old
+            self._ret_sum[window] = s
+            self._ret_sum_sq[window] = s_sq
+        
+    def _refresh_cache(self):
+        """Compute metrics of the latest snapshot once per update"""
+        snapshot = self._get_snapshot(-1)
+        self._cache = {
+            'spread': self._get_spread(snapshot),
+            'imbalance': self._get_orderbook_imbalance(snapshot),
+            'depth_ratio': self._get_depth_ratio(snapshot),
+            'liquidity': self._get_liquidity_estimate(),
+            'vol': self._calculate_volatility()
+        }
+        self._cache_id = self.update_count
+        
+    def _cached(self, key):
+        """Read a cached metric of the latest snapshot"""
+        assert self._cache_id == self.update_count, "stale snapshot cache"
+        return self._cache[key]
+        
+    def _history_index(self, window=None):
+        """Ring rows of the last `window` snapshots in chronological order"""
+        n = self.hist_count if window is None else min(window, self.hist_count)
+        return (np.arange(self.hist_head - n, self.hist_head)) % HISTORY_SIZE
+        
+    def _get_snapshot(self, i=-1):
+        """BookSnapshot of row views for a negative history offset (-1 = latest)"""
+        row = (self.hist_head + i) % HISTORY_SIZE
+        hist_row = self.hist[row]
+        return BookSnapshot(row, hist_row[ASK_PX], hist_row[ASK_QTY],
+                            hist_row[BID_PX], hist_row[BID_QTY])
             
     def _validate_orderbook(self, orderbook):
         """Validate orderbook structure and data quality"""
+        if not isinstance(orderbook, dict):
+            return False
         required_keys = {'asks', 'bids', 'timestamp'}
         if not all(key in orderbook for key in required_keys):
             return False
@@ -85,168 +332,188 @@ class TradeSimulator:
                 return False
                 
             # Validate numeric values
-            float(orderbook['asks'][0][0])
+            best_ask = float(orderbook['asks'][0][0])
             float(orderbook['asks'][0][1])
-            return True
+            best_bid = float(orderbook['bids'][0][0])
+            # A non-positive or non-finite touch would put NaN log-mids into the volatility sums
+            return 0 < best_ask < math.inf and 0 < best_bid < math.inf
         except (ValueError, IndexError, TypeError):
             return False
             
     def _train_models(self):
         """Train all models with enhanced features"""
-        if len(self.historical_data) < 100:
-            return
-            
-        # Prepare slippage model data
-        X_slip, y_slip = self._prepare_slippage_training_data()
+        # Snapshot training data under the lock, fit without it
+        with self._lock:
+            if self.hist_count < 100:
+                return
+            features = self._history_features()
+            X_slip, y_slip = self._prepare_slippage_training_data(features)
+            X_mt, y_mt = self._prepare_maker_taker_data(features)
+        
+        # Slippage model: only the cached parameters are read by the metrics path
         if len(X_slip) > 20:
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                self.slippage_model.fit(X_slip, y_slip)
+            if self._slip_fitted:
+                # Only the samples added since the last retrain
+                X_slip, y_slip = X_slip[-50:], y_slip[-50:]
+            self._partial_fit_slippage_model(X_slip, y_slip)
         
-        # Prepare maker/taker model data
-        X_mt, y_mt = self._prepare_maker_taker_data()
+        # Maker/taker model: fit a copy and swap it in
         if len(set(y_mt)) > 1:  # Need at least two classes
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                self.maker_taker_model.fit(X_mt, y_mt)
-                
-    def _prepare_slippage_training_data(self):
-        """Prepare enhanced features for slippage model"""
-        X = []
-        y = []
-        
-        for i in range(2, len(self.historical_data)):
-            current = self.historical_data[i]
-            previous = self.historical_data[i-1]
-            
-            try:
-                # Enhanced feature set
-                spread = self._get_spread(current)
-                imbalance = self._get_orderbook_imbalance(current)
-                vol = self._calculate_volatility(window=30)
-                depth_ratio = self._get_depth_ratio(current)
-                price_change = self._get_price_change(current, previous)
-                
-                X.append([spread, imbalance, vol, depth_ratio, price_change])
+            model = clone(self.maker_taker_model)
+            model.fit(X_mt, y_mt)
+            if len(X_mt) >= SCALER_FREEZE_SAMPLES:
+                self._freeze_scaler(model)
+            with self._lock:
+                self.maker_taker_model = model
                 
-                # Calculate actual slippage
-                mid_price = self._get_mid_price_from_snapshot(previous)
-                executed_price = float(current['asks'][0][0])
-                y.append((executed_price - mid_price)/mid_price)
-            except (IndexError, ValueError):
-                continue
+    def _freeze_scaler(self, model):
+        """Swap a pipeline's fitted scaler for a fixed transform so later fits skip refitting it"""
+        name, scaler = model.steps[0]
+        if not isinstance(scaler, StandardScaler):
+            return
+        frozen = FunctionTransformer(
+            _standardize,
+            kw_args={'mu': scaler.mean_.copy(), 'sigma': scaler.scale_.copy()}
+        )
+        model.steps[0] = (name, frozen)
                 
-        return np.array(X), np.array(y)
+    def _partial_fit_slippage_model(self, X, y):
+        """Incrementally update scaler and regressor, then cache their parameters"""
+        scaler, regressor = self.slippage_model[0], self.slippage_model[-1]
+        if getattr(scaler, 'n_samples_seen_', 0) < SCALER_FREEZE_SAMPLES:
+            scaler.partial_fit(X)
+        regressor.partial_fit(scaler.transform(X), y)
+        self._slip_fitted = True
+        
+        with self._lock:
+            self._slip_w = regressor.coef_.copy()
+            self._slip_b = float(regressor.intercept_[0])
+            self._slip_mu = scaler.mean_.copy()
+            self._slip_sigma = scaler.scale_.copy()
+        
+    def _history_features(self):
+        """Per-snapshot feature columns over the whole history in one vectorized pass"""
+        idx = self._history_index()
+        best_ask = self.best_ask_hist[idx]
+        rows = self.hist[idx]
+        asks_qty = rows[:, ASK_QTY]
+        bids_qty = rows[:, BID_QTY]
+        mid = self.mid_hist[idx]
+        safe_mid = np.where(mid > 0, mid, 1.0)
+        
+        bids10 = bids_qty[:, :10].sum(axis=1, dtype=np.float64)
+        asks10 = asks_qty[:, :10].sum(axis=1, dtype=np.float64)
+        total10 = bids10 + asks10
+        imbalance = np.where(total10 > 0, (bids10 - asks10) / np.where(total10 > 0, total10, 1.0), 0.0)
+        
+        immediate = self.volume_hist[idx]
+        deep = asks_qty[:, 5:20].sum(axis=1, dtype=np.float64) + bids_qty[:, 5:20].sum(axis=1, dtype=np.float64)
+        depth_ratio = deep / (immediate + 1e-6)
+        
+        # Change vs previous snapshot, aligned so price_change[i] pairs (i, i-1)
+        price_change = np.zeros_like(mid)
+        price_change[1:] = np.where(mid[:-1] > 0, (mid[1:] - mid[:-1]) / safe_mid[:-1], 0.0)
         
-    def _prepare_maker_taker_data(self):
-        """Prepare enhanced features for maker/taker model"""
-        X = []
-        y = []
+        return {
+            'best_ask': best_ask,
+            'mid': mid,
+            'spread': self.spread_hist[idx],
+            'imbalance': imbalance,
+            'depth_ratio': depth_ratio,
+            'volume': immediate,
+            'price_change': price_change
+        }
         
-        for i in range(2, len(self.historical_data)):
-            current = self.historical_data[i]
-            previous = self.historical_data[i-1]
-            
-            try:
-                # Enhanced features
-                price_change = self._get_price_change(current, previous)
-                volume_ratio = self._get_volume_ratio(current, previous)
-                spread_change = self._get_spread_change(current, previous)
-                vol = self._calculate_volatility(window=20)
-                
-                X.append([price_change, volume_ratio, spread_change, vol])
-                
-                # Label based on aggressive order detection
-                mid_price = self._get_mid_price_from_snapshot(previous)
-                current_price = float(current['asks'][0][0])
-                y.append(1 if current_price < mid_price * 1.0001 else 0)
-            except (IndexError, ValueError):
-                continue
-                
-        return np.array(X), np.array(y)
+    def _prepare_slippage_training_data(self, features):
+        """Prepare enhanced features for slippage model"""
+        if len(features['mid']) < 3:
+            return np.empty((0, 5)), np.empty(0)
+        cur, prev = slice(2, None), slice(1, -1)
+        prev_mid = features['mid'][prev]
+        valid = prev_mid > 0
+        
+        vol = self._calculate_volatility(window=30)
+        X = np.column_stack([
+            features['spread'][cur],
+            features['imbalance'][cur],
+            np.full(len(prev_mid), vol),
+            features['depth_ratio'][cur],
+            features['price_change'][cur]
+        ])
+        
+        # Actual slippage of the best ask against the previous mid
+        y = (features['best_ask'][cur] - prev_mid) / np.where(valid, prev_mid, 1.0)
+        return X[valid], y[valid]
+        
+    def _prepare_maker_taker_data(self, features):
+        """Prepare enhanced features for maker/taker model"""
+        if len(features['mid']) < 3:
+            return np.empty((0, 4)), np.empty(0, dtype=int)
+        cur, prev = slice(2, None), slice(1, -1)
+        prev_mid = features['mid'][prev]
+        
+        vol = self._calculate_volatility(window=20)
+        X = np.column_stack([
+            features['price_change'][cur],
+            features['volume'][cur] / (features['volume'][prev] + 1e-6),
+            features['spread'][cur] / (features['spread'][prev] + 1e-6),
+            np.full(len(prev_mid), vol)
+        ])
+        
+        # Label based on aggressive order detection
+        y = np.where(features['best_ask'][cur] < prev_mid * 1.0001, 1, 0)
+        return X, y
 
     def calculate_slippage(self, quantity, side='buy', volatility_sens=0.5):
         """Enhanced slippage calculation with size and volatility sensitivity"""
         if not self.last_orderbook:
             return 0
             
-        # Base slippage from model
-        spread = self._get_spread(self.last_orderbook)
-        imbalance = self._get_orderbook_imbalance(self.last_orderbook)
-        vol = self._calculate_volatility()
-        depth_ratio = self._get_depth_ratio(self.last_orderbook)
-        price_change = self._get_recent_price_change()
-        
-        try:
-            model_input = np.array([[spread, imbalance, vol, depth_ratio, price_change]])
-            predicted = self.slippage_model.predict(model_input)[0]
-            base_slippage = max(0, predicted) * 100
-        except Exception:
-            base_slippage = 0
-            
-        # Size-based adjustment (non-linear)
-        size_factor = min(0.5, (quantity ** 0.8) * 0.001)
-        
-        # Volatility sensitivity (0-1 input scales adjustment)
-        vol_adjustment = 1 + (volatility_sens * 2)  # 1x-3x scaling
-        
-        return base_slippage * vol_adjustment + size_factor
+        # Model predict and adjustments run in one compiled kernel
+        return OptimizedCalculations.slippage_kernel(
+            self._cached('spread'),
+            self._cached('imbalance'),
+            self._cached('vol'),
+            self._cached('depth_ratio'),
+            self._get_recent_price_change(),
+            quantity, volatility_sens,
+            self._slip_w, self._slip_b, self._slip_mu, self._slip_sigma
+        )
         
     def calculate_market_impact(self, quantity, side='buy', volatility_sens=0.5):
         """Enhanced Almgren-Chriss model with volatility sensitivity"""
-        if not self.last_orderbook or len(self.historical_data) < 20:
+        if not self.last_orderbook or self.hist_count < 20:
             return self.last_impact if hasattr(self, 'last_impact') else 0
             
-        # Calculate liquidity at different depth tiers
-        levels = self.last_orderbook['asks'] if side == 'buy' else self.last_orderbook['bids']
-        liquidity_tiers = [
-            sum(float(qty) for _, qty in levels[:5]),  # Immediate
-            sum(float(qty) for _, qty in levels[5:10]), # Near
-            sum(float(qty) for _, qty in levels[10:20]) # Deep
-        ]
-        total_liquidity = sum(liquidity_tiers)
-        
-        if total_liquidity <= 0:
-            return 0
-            
-        # Weighted liquidity calculation
-        liquidity = (
-            0.6 * liquidity_tiers[0] + 
-            0.3 * liquidity_tiers[1] + 
-            0.1 * liquidity_tiers[2]
+        # Tiered liquidity and dynamic eta/gamma run in one compiled kernel
+        qty = self.asks_qty[:self.n_asks] if side == 'buy' else self.bids_qty[:self.n_bids]
+        impact = OptimizedCalculations.market_impact_kernel(
+            qty, quantity, self._cached('vol'), volatility_sens
         )
-        
-        # Dynamic impact parameters based on volatility
-        vol = self._calculate_volatility()
-        eta = 0.05 + (vol * 0.15)  # Temporary impact coefficient
-        gamma = 0.01 + (vol * 0.04) # Permanent impact coefficient
-        
-        # Size-adjusted impact
-        size_ratio = quantity / liquidity
-        temp_impact = eta * (size_ratio ** 0.7)
-        perm_impact = gamma * (size_ratio ** 0.5)
-        
-        # Apply volatility sensitivity
-        impact = (temp_impact + perm_impact) * (0.8 + volatility_sens * 0.4)
-        self.last_impact = impact * 100  # Store as percentage
+        if impact <= 0:
+            return 0
+        self.last_impact = impact  # Stored as percentage
         return self.last_impact
         
     def estimate_maker_taker_proportion(self):
         """Enhanced maker/taker prediction with current market features"""
-        if len(self.historical_data) < 50:
+        if self.hist_count < 50:
             return (0.7, 0.3)  # Default to more maker activity
             
         try:
             # Current market features
             price_change = self._get_recent_price_change()
-            volume_ratio = self._get_volume_ratio(self.last_orderbook, self.historical_data[-2])
-            spread_change = self._get_spread_change(self.last_orderbook, self.historical_data[-2])
+            volume_ratio = self._get_volume_ratio(self._get_snapshot(-1), self._get_snapshot(-2))
+            spread_change = self._get_spread_change(self._get_snapshot(-1), self._get_snapshot(-2))
             vol = self._calculate_volatility(window=20)
             
             # Predict
-            proba = self.maker_taker_model.predict_proba(
-                np.array([[price_change, volume_ratio, spread_change, vol]])
-            )[0]
+            model_input = self._mt_x
+            model_input[0, 0] = price_change
+            model_input[0, 1] = volume_ratio
+            model_input[0, 2] = spread_change
+            model_input[0, 3] = vol
+            proba = self.maker_taker_model.predict_proba(model_input)[0]
             return (proba[0], proba[1])  # (maker, taker)
         except Exception:
             return (0.7, 0.3)
@@ -255,29 +522,24 @@ class TradeSimulator:
     
     def _get_spread(self, snapshot):
         """Bid-ask spread in percentage terms"""
-        if not snapshot['asks'] or not snapshot['bids']:
-            return 0
-        best_ask = float(snapshot['asks'][0][0])
-        best_bid = float(snapshot['bids'][0][0])
-        mid = (best_ask + best_bid) / 2
-        return (best_ask - best_bid) / mid if mid > 0 else 0
+        return float(self.spread_hist[snapshot.row])
         
     def _get_orderbook_imbalance(self, snapshot, depth=10):
         """Order book imbalance metric (-1 to 1)"""
-        bids = sum(float(qty) for _, qty in snapshot['bids'][:depth])
-        asks = sum(float(qty) for _, qty in snapshot['asks'][:depth])
+        bids = float(snapshot.bids_qty[:depth].sum(dtype=np.float64))
+        asks = float(snapshot.asks_qty[:depth].sum(dtype=np.float64))
         total = bids + asks
         return (bids - asks) / total if total > 0 else 0
         
     def _get_depth_ratio(self, snapshot):
         """Ratio of deep liquidity to immediate liquidity"""
-        immediate = sum(float(qty) for _, qty in snapshot['asks'][:5] + snapshot['bids'][:5])
-        deep = sum(float(qty) for _, qty in snapshot['asks'][5:20] + snapshot['bids'][5:20])
+        immediate = float(self.volume_hist[snapshot.row])
+        deep = float(snapshot.asks_qty[5:20].sum(dtype=np.float64) + snapshot.bids_qty[5:20].sum(dtype=np.float64))
         return deep / (immediate + 1e-6)
         
     def _get_price_change(self, current, previous, window=5):
         """Price change over recent history"""
-        if len(self.historical_data) < window:
+        if self.hist_count < window:
             return 0
         current_mid = self._get_mid_price_from_snapshot(current)
         previous_mid = self._get_mid_price_from_snapshot(previous)
@@ -285,14 +547,14 @@ class TradeSimulator:
         
     def _get_recent_price_change(self):
         """Most recent price change"""
-        if len(self.historical_data) < 2:
+        if self.hist_count < 2:
             return 0
-        return self._get_price_change(self.historical_data[-1], self.historical_data[-2])
+        return self._get_price_change(self._get_snapshot(-1), self._get_snapshot(-2))
         
     def _get_volume_ratio(self, current, previous):
         """Volume change ratio"""
-        current_vol = sum(float(qty) for _, qty in current['asks'][:5] + current['bids'][:5])
-        previous_vol = sum(float(qty) for _, qty in previous['asks'][:5] + previous['bids'][:5])
+        current_vol = self.volume_hist[current.row]
+        previous_vol = self.volume_hist[previous.row]
         return current_vol / (previous_vol + 1e-6)
         
     def _get_spread_change(self, current, previous):
@@ -303,33 +565,32 @@ class TradeSimulator:
         
     def _calculate_volatility(self, window=30):
         """Realized volatility with adaptive window"""
-        if len(self.historical_data) < window:
+        if self.hist_count < window:
             return self.last_volatility if hasattr(self, 'last_volatility') else 0
             
-        prices = [self._get_mid_price_from_snapshot(snap) 
-                 for snap in list(self.historical_data)[-window:]]
-        if len(prices) < 2:
+        if window < 2:
             return 0
             
-        log_returns = np.diff(np.log(prices))
-        vol = np.std(log_returns) * np.sqrt(365*24)  # Annualized
+        if window in self._ret_sum:
+            n = window - 1
+            mean = self._ret_sum[window] / n
+            variance = max(self._ret_sum_sq[window] / n - mean * mean, 0.0)
+            vol = math.sqrt(variance) * SQRT_ANNUAL  # Annualized
+        else:
+            log_returns = np.diff(self.log_mid_hist[self._history_index(window)])
+            vol = np.std(log_returns) * SQRT_ANNUAL  # Annualized
         self.last_volatility = vol
         return vol
         
     def _get_mid_price_from_snapshot(self, snapshot):
         """Robust mid price calculation"""
-        try:
-            best_ask = float(snapshot['asks'][0][0]) if snapshot['asks'] else 0
-            best_bid = float(snapshot['bids'][0][0]) if snapshot['bids'] else 0
-            return (best_ask + best_bid) / 2 if best_ask and best_bid else 0
-        except (IndexError, ValueError):
-            return 0
+        return float(self.mid_hist[snapshot.row])
 
     def get_mid_price(self):
         """Public method to get mid price of the last orderbook"""
         if not self.last_orderbook:
             return 0
-        return self._get_mid_price_from_snapshot(self.last_orderbook)
+        return self._get_mid_price_from_snapshot(self._get_snapshot(-1))
             
     def calculate_fees(self, quantity, price, tier=1, is_maker=False):
         """Tiered fee calculation"""
@@ -338,13 +599,22 @@ class TradeSimulator:
         return quantity * price * fee_rate
         
     def calculate_all_metrics(self, quantity, side='buy', volatility_sens=0.5, fee_tier=1, price=None):
-        """Comprehensive metric calculation with timing"""
+        """Comprehensive metric calculation with timing
+
+        The returned dict is reused and overwritten by the next call; copy it
+        before keeping it or handing it to another thread.
+        """
+        with self._lock:
+            return self._calculate_all_metrics(quantity, side, volatility_sens, fee_tier, price)
+            
+    def _calculate_all_metrics(self, quantity, side, volatility_sens, fee_tier, price):
+        """Metric calculation body, caller holds the lock"""
         start_time = time.time()
         
         if not self.last_orderbook:
             return None
             
-        mid_price = self._get_mid_price_from_snapshot(self.last_orderbook)
+        mid_price = self._get_mid_price_from_snapshot(self._get_snapshot(-1))
         if mid_price <= 0:
             return None
         
@@ -364,39 +634,59 @@ class TradeSimulator:
         
         # Performance metrics
         processing_time = (time.time() - start_time) * 1000
-        self.processing_times.append(processing_time)
-        
-        return {
-            'mid_price': mid_price,
-            'slippage': slippage,
-            'fees': fees,
-            'market_impact': market_impact,
-            'net_cost': net_cost,
-            'maker_taker_proportion': (maker_prob, taker_prob),
-            'processing_time': processing_time,
-            'avg_processing_time': self._get_avg_processing_time(),
-            'update_frequency': self._get_avg_update_frequency(),
-            'orderbook_depth': len(self.last_orderbook['asks']) if self.last_orderbook else 0,
-            'volatility': self._calculate_volatility(),
-            'liquidity': self._get_liquidity_estimate()
-        }
+        self._record_processing_time(processing_time)
+        
+        # Same dict every call; readers see the latest values without a rebuild
+        metrics = self._metrics
+        metrics['mid_price'] = mid_price
+        metrics['slippage'] = slippage
+        metrics['fees'] = fees
+        metrics['market_impact'] = market_impact
+        metrics['net_cost'] = net_cost
+        metrics['maker_taker_proportion'] = (maker_prob, taker_prob)
+        metrics['processing_time'] = processing_time
+        metrics['avg_processing_time'] = self._get_avg_processing_time()
+        metrics['update_frequency'] = self._get_avg_update_frequency()
+        metrics['orderbook_depth'] = len(self.last_orderbook['asks'])
+        metrics['volatility'] = self._cached('vol')
+        metrics['liquidity'] = self._cached('liquidity')
+        return metrics
+        
+    def _record_processing_time(self, processing_time):
+        """Add to the processing time window, keeping its sorted copy in step"""
+        window = self.processing_times
+        if len(window) == window.maxlen:
+            del self._sorted_processing_times[bisect_left(self._sorted_processing_times, window[0])]
+        window.append(processing_time)
+        insort(self._sorted_processing_times, processing_time)
+        
+    def _record_update_interval(self, interval):
+        """Add to the update interval window, keeping its running sum in step"""
+        window = self.update_frequencies
+        if len(window) == window.maxlen:
+            self._update_frequency_sum -= window[0]
+        window.append(interval)
+        self._update_frequency_sum += interval
         
     def _get_avg_processing_time(self):
         """Robust average processing time calculation"""
-        if not self.processing_times:
+        ordered = self._sorted_processing_times
+        n = len(ordered)
+        if not n:
             return 0
-        return np.percentile(self.processing_times, 50)  # Median
+        mid = n // 2
+        return ordered[mid] if n % 2 else (ordered[mid - 1] + ordered[mid]) / 2  # Median
         
     def _get_avg_update_frequency(self):
         """Average update frequency in seconds"""
         if not self.update_frequencies:
             return 0
-        return np.mean(self.update_frequencies)
+        return self._update_frequency_sum / len(self.update_frequencies)
         
     def _get_liquidity_estimate(self):
         """Estimate total liquidity in order book"""
         if not self.last_orderbook:
             return 0
-        bids = sum(float(qty) for _, qty in self.last_orderbook['bids'][:20])
-        asks = sum(float(qty) for _, qty in self.last_orderbook['asks'][:20])
+        bids = self.bids_qty[:min(self.n_bids, 20)].sum()
+        asks = self.asks_qty[:min(self.n_asks, 20)].sum()
         return bids + asks
\ No newline at end of file
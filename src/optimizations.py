@@ -1,18 +1,24 @@
+import math
 import numpy as np
-from numba import jit
-import pandas as pd
+from numba import njit
+
+SQRT_ANNUAL = math.sqrt(365*24)  # Hourly to annualized volatility
+
+# Integer side codes for the compiled kernels (0=buy, 1=sell)
+SIDE_BUY = 0
+SIDE_SELL = 1
 
 class OptimizedCalculations:
     @staticmethod
-    @jit(nopython=True)
+    @njit('float64(float64[:,::1], float64, float64, int8)', cache=True, fastmath=True)
     def numba_slippage(levels, quantity, mid_price, side):
-        """Optimized slippage calculation using Numba"""
-        executed_qty = 0
-        total_cost = 0
+        """Optimized slippage calculation using Numba (levels: C-contiguous [price, qty] rows)"""
+        executed_qty = 0.0
+        total_cost = 0.0
         
-        for i in range(len(levels)):
-            price = float(levels[i][0])
-            qty = float(levels[i][1])
+        for i in range(levels.shape[0]):
+            price = levels[i, 0]
+            qty = levels[i, 1]
             
             if executed_qty >= quantity:
                 break
@@ -23,18 +29,87 @@ class OptimizedCalculations:
             
         if executed_qty > 0:
             avg_price = total_cost / executed_qty
-            if side == 'buy':
+            if side == SIDE_BUY:
                 slippage = (avg_price - mid_price) / mid_price
             else:
                 slippage = (mid_price - avg_price) / mid_price
             return slippage * 100
-        return 0
+        return 0.0
+        
+    @staticmethod
+    def numpy_slippage(px, qty, quantity, mid_price, side_sign):
+        """Vectorized order book walk on SoA price/qty arrays (side_sign: +1 buy, -1 sell)"""
+        if quantity <= 0 or len(qty) == 0:
+            return 0.0
+        cum = qty.cumsum()
+        k = np.searchsorted(cum, quantity, side='left')
+        if k == len(qty):
+            # Insufficient liquidity - fill everything available
+            executed_qty = cum[-1]
+            if executed_qty <= 0:
+                return 0.0
+            total_cost = np.dot(qty, px)
+        else:
+            executed_qty = quantity
+            filled = cum[k-1] if k else 0.0
+            total_cost = np.dot(qty[:k], px[:k]) + (quantity - filled) * px[k]
+        avg_price = total_cost / executed_qty
+        return side_sign * (avg_price - mid_price) / mid_price * 100
+        
+    @staticmethod
+    @njit('float64(float64, float64, float64, float64, float64, float64, float64, '
+          'float64[::1], float64, float64[::1], float64[::1])', cache=True, fastmath=True)
+    def slippage_kernel(spread, imbalance, vol, depth_ratio, price_change,
+                        quantity, volatility_sens, w, b, mu, sigma):
+        """Fused linear slippage predict plus size/volatility adjustment"""
+        predicted = b
+        predicted += (spread - mu[0]) / sigma[0] * w[0]
+        predicted += (imbalance - mu[1]) / sigma[1] * w[1]
+        predicted += (vol - mu[2]) / sigma[2] * w[2]
+        predicted += (depth_ratio - mu[3]) / sigma[3] * w[3]
+        predicted += (price_change - mu[4]) / sigma[4] * w[4]
+        base_slippage = max(0.0, predicted) * 100
+        
+        # Size-based adjustment (non-linear)
+        size_factor = min(0.5, (quantity ** 0.8) * 0.001)
+        
+        # Volatility sensitivity (0-1 input scales adjustment)
+        vol_adjustment = 1 + (volatility_sens * 2)  # 1x-3x scaling
+        
+        return base_slippage * vol_adjustment + size_factor
+        
+    @staticmethod
+    @njit('float64(float64[::1], float64, float64, float64)', cache=True, fastmath=True)
+    def market_impact_kernel(qty, quantity, vol, volatility_sens):
+        """Fused tiered-liquidity Almgren-Chriss impact, in percent"""
+        # Liquidity at immediate (0-5), near (5-10) and deep (10-20) tiers
+        tiers = np.zeros(3)
+        for i in range(min(qty.shape[0], 20)):
+            if i < 5:
+                tiers[0] += qty[i]
+            elif i < 10:
+                tiers[1] += qty[i]
+            else:
+                tiers[2] += qty[i]
+        if tiers[0] + tiers[1] + tiers[2] <= 0:
+            return 0.0
+        liquidity = 0.6 * tiers[0] + 0.3 * tiers[1] + 0.1 * tiers[2]
+        
+        # Dynamic impact parameters based on volatility
+        eta = 0.05 + (vol * 0.15)  # Temporary impact coefficient
+        gamma = 0.01 + (vol * 0.04) # Permanent impact coefficient
+        
+        size_ratio = quantity / liquidity
+        temp_impact = eta * (size_ratio ** 0.7)
+        perm_impact = gamma * (size_ratio ** 0.5)
+        impact = (temp_impact + perm_impact) * (0.8 + volatility_sens * 0.4)
+        return impact * 100
         
     @staticmethod
     def vectorized_volatility(price_series):
         """Vectorized volatility calculation"""
         log_returns = np.log(price_series[1:]/price_series[:-1])
-        return np.std(log_returns) * np.sqrt(365*24)
+        return np.std(log_returns) * SQRT_ANNUAL
         
     @staticmethod
     def optimized_market_impact(quantity, liquidity, volatility, side='buy'):
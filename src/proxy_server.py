@@ -1,15 +1,24 @@
 import asyncio
-import json
 import logging
+import orjson
 import websockets
 from websockets import WebSocketServerProtocol
 import threading
 
+try:
+    import uvloop  # Not available on Windows
+except ImportError:
+    uvloop = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("proxy_server")
 
-# Store connected frontend clients
-connected_clients = set()
+# Store connected frontend clients, mapped to their outbound message queue
+connected_clients = {}
+
+MAX_BATCH_SIZE = 64  # Exchange messages coalesced into one frame
+CLIENT_QUEUE_SIZE = 100  # Pending frames per client before dropping
+MAX_MESSAGE_SIZE = 2 ** 20
 
 # Exchange WebSocket URLs (Binance only for now)
 EXCHANGE_WS_URLS = {
@@ -18,7 +27,7 @@ EXCHANGE_WS_URLS = {
 
 async def exchange_listener(uri: str, forward_queue: asyncio.Queue):
     try:
-        async with websockets.connect(uri) as websocket:
+        async with websockets.connect(uri, compression=None, max_size=MAX_MESSAGE_SIZE) as websocket:
             logger.info(f"Connected to exchange WebSocket: {uri}")
             if "coinbase" in uri:
                 # Subscribe to level2 channel for Coinbase
@@ -27,7 +36,7 @@ async def exchange_listener(uri: str, forward_queue: asyncio.Queue):
                     "product_ids": ["BTC-USD"],
                     "channels": ["level2"]
                 }
-                await websocket.send(json.dumps(subscribe_msg))
+                await websocket.send(orjson.dumps(subscribe_msg).decode())
             try:
                 async for message in websocket:
                     await forward_queue.put(message)
@@ -36,24 +45,52 @@ async def exchange_listener(uri: str, forward_queue: asyncio.Queue):
     except Exception as e:
         logger.error(f"Failed to connect to exchange {uri}: {e}")
 
+def build_batch(messages):
+    """Join JSON text messages into a single JSON array frame"""
+    return "[" + ",".join(m.decode() if isinstance(m, bytes) else m for m in messages) + "]"
+
 async def forward_to_clients(forward_queue: asyncio.Queue):
     while True:
-        message = await forward_queue.get()
-        if connected_clients:
-            logger.info(f"Forwarding message to {len(connected_clients)} clients")
-            send_tasks = [asyncio.create_task(client.send(message)) for client in connected_clients]
-            await asyncio.wait(send_tasks)
+        # Block for one message, then drain whatever else is already queued
+        batch = [await forward_queue.get()]
+        while len(batch) < MAX_BATCH_SIZE:
+            try:
+                batch.append(forward_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        if not connected_clients:
+            continue
+        payload = build_batch(batch)
+        for websocket, client_queue in connected_clients.items():
+            if client_queue.full():
+                # Drop the oldest frame so a slow client still gets the freshest books
+                client_queue.get_nowait()
+                logger.debug(f"Dropping stale batch for slow client: {websocket.remote_address}")
+            client_queue.put_nowait(payload)
+
+async def client_writer(websocket: WebSocketServerProtocol, client_queue: asyncio.Queue):
+    """Long-lived sender task, one per client; a failed send drops the client"""
+    try:
+        while True:
+            payload = await client_queue.get()
+            await websocket.send(payload)
+    except Exception as e:
+        # Stop broadcasting to this client right away instead of filling its queue
+        connected_clients.pop(websocket, None)
+        logger.debug(f"Dropped client {websocket.remote_address}: {e!r}")
 
 async def register_client(websocket: WebSocketServerProtocol):
-    connected_clients.add(websocket)
+    client_queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+    connected_clients[websocket] = client_queue
     logger.info(f"Client connected: {websocket.remote_address}")
+    return asyncio.create_task(client_writer(websocket, client_queue))
 
 async def unregister_client(websocket: WebSocketServerProtocol):
-    connected_clients.remove(websocket)
+    connected_clients.pop(websocket, None)
     logger.info(f"Client disconnected: {websocket.remote_address}")
 
 async def proxy_handler(websocket):
-    await register_client(websocket)
+    writer = await register_client(websocket)
     try:
         async for message in websocket:
             # For now, just log messages from clients (if any)
@@ -61,6 +98,7 @@ async def proxy_handler(websocket):
     except websockets.ConnectionClosed:
         pass
     finally:
+        writer.cancel()
         await unregister_client(websocket)
 
 async def main():
@@ -75,12 +113,15 @@ async def main():
     tasks.append(asyncio.create_task(forward_to_clients(forward_queue)))
 
     # Start WebSocket server for frontend clients
-    server = await websockets.serve(proxy_handler, "0.0.0.0", 8765)
+    server = await websockets.serve(proxy_handler, "0.0.0.0", 8765,
+                                  compression=None, max_size=MAX_MESSAGE_SIZE)
     logger.info("Proxy WebSocket server started on ws://0.0.0.0:8765")
 
     await asyncio.gather(*tasks)
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        uvloop.install()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
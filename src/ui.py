@@ -1,16 +1,60 @@
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                             QLabel, QLineEdit, QComboBox, QPushButton, QDoubleSpinBox,
                             QFormLayout, QGroupBox, QSlider, QProgressBar)
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QEvent
 from PyQt5.QtGui import QColor, QPalette
+from collections import namedtuple
 import sys
 
+# Format specs and unit suffixes for the metrics labels
+_FMT_PRICE = ',.2f'
+_FMT_USDT = ',.4f'
+_FMT_PCT4 = '.4f'
+_FMT_2DP = '.2f'
+_USDT_SUFFIX = ' USDT'
+_PCT_SUFFIX = '%'
+_MS_SUFFIX = ' ms'
+_HZ_SUFFIX = ' Hz'
+
+# Display-ready metrics: label strings, integer bar values and the slippage severity bucket
+UiSnapshot = namedtuple('UiSnapshot', [
+    'mid_price_txt', 'slippage_txt', 'slippage_bar', 'slippage_bucket',
+    'fees_txt', 'market_impact_txt', 'net_cost_txt',
+    'maker_txt', 'maker_bar', 'taker_txt', 'taker_bar',
+    'latency_txt', 'avg_processing_txt', 'update_freq_txt', 'orderbook_depth'])
+
+def prepare_snapshot(metrics):
+    """Format a metrics dict for display, safe to call off the GUI thread"""
+    slippage = metrics['slippage']
+    maker_pct = metrics['maker_taker_proportion'][0] * 100
+    taker_pct = metrics['maker_taker_proportion'][1] * 100
+    update_freq = 1/metrics['update_frequency'] if metrics['update_frequency'] > 0 else 0
+    return UiSnapshot(
+        mid_price_txt=format(metrics['mid_price'], _FMT_PRICE) + _USDT_SUFFIX,
+        slippage_txt=format(slippage, _FMT_PCT4) + _PCT_SUFFIX,
+        slippage_bar=int(slippage * 100),  # Convert % to 0.01% units
+        slippage_bucket='red' if slippage > 0.5 else 'orange' if slippage > 0.1 else 'green',
+        fees_txt=format(metrics['fees'], _FMT_USDT) + _USDT_SUFFIX,
+        market_impact_txt=format(metrics['market_impact'], _FMT_PCT4) + _PCT_SUFFIX,
+        net_cost_txt=format(metrics['net_cost'], _FMT_USDT) + _USDT_SUFFIX,
+        maker_txt=format(maker_pct, _FMT_2DP) + _PCT_SUFFIX,
+        maker_bar=int(maker_pct),
+        taker_txt=format(taker_pct, _FMT_2DP) + _PCT_SUFFIX,
+        taker_bar=int(taker_pct),
+        latency_txt=format(metrics['processing_time'], _FMT_2DP) + _MS_SUFFIX,
+        avg_processing_txt=format(metrics['avg_processing_time'], _FMT_2DP) + _MS_SUFFIX,
+        update_freq_txt=format(update_freq, _FMT_2DP) + _HZ_SUFFIX,
+        orderbook_depth=int(metrics['orderbook_depth']))
+
 class TradeSimulatorUI(QMainWindow):
-    def __init__(self, simulator_callback):
+    def __init__(self, simulator):
         super().__init__()
-        self.simulator_callback = simulator_callback
+        # simulator pushes metrics via its metrics_ready signal and takes order params via set_params
+        self.simulator = simulator
         self.init_ui()
-        self.setup_timer()
+        self.setup_redraw_timer()
+        self.simulator.metrics_ready.connect(self.update_metrics)
+        self._apply_params()
         
     def init_ui(self):
         self.setWindowTitle('Cryptocurrency Trade Simulator')
@@ -70,6 +114,19 @@ class TradeSimulatorUI(QMainWindow):
         self.slippage_bar = QProgressBar()
         self.slippage_bar.setRange(0, 1000)  # 0-10% in 0.01% increments
         
+        # One palette per slippage severity, swapped in only when the severity changes
+        self._palettes = {}
+        for bucket, color in (('red', QColor(255, 0, 0)),
+                              ('orange', QColor(255, 165, 0)),
+                              ('green', QColor(0, 255, 0))):
+            palette = QPalette(self.slippage_bar.palette())
+            palette.setColor(QPalette.Highlight, color)
+            self._palettes[bucket] = palette
+        self._last_slip_bucket = None
+        
+        # Last string shown per widget, so unchanged values skip the Qt setter
+        self._last_text = {}
+        
         self.fees_label = QLabel('0.00 USDT')
         self.market_impact_label = QLabel('0.00%')
         self.net_cost_label = QLabel('0.00 USDT')
@@ -117,6 +174,15 @@ class TradeSimulatorUI(QMainWindow):
         # Connect signals
         self.volatility_slider.valueChanged.connect(self.update_volatility_label)
         
+        # Send order parameters only once the user stops changing them
+        self._param_debounce = QTimer(self)
+        self._param_debounce.setSingleShot(True)
+        self._param_debounce.setInterval(100)
+        self._param_debounce.timeout.connect(self._apply_params)
+        self.quantity_input.valueChanged.connect(self._schedule_params)
+        self.volatility_slider.valueChanged.connect(self._schedule_params)
+        self.side_combo.currentIndexChanged.connect(self._schedule_params)
+        
     def update_volatility_label(self, value):
         """Update volatility sensitivity label"""
         if value < 33:
@@ -126,59 +192,107 @@ class TradeSimulatorUI(QMainWindow):
         else:
             self.volatility_label.setText('High')
     
-    def setup_timer(self):
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_metrics)
-        self.timer.start(500)  # Update every 500ms
+    def _schedule_params(self, *_):
+        """Restart the parameter debounce, signal arguments are ignored"""
+        self._param_debounce.start()
         
-    def update_metrics(self):
-        """Update all displayed metrics"""
+    def _apply_params(self):
+        """Send the current order parameters to the simulator"""
         quantity = self.quantity_input.value()
         side = 'buy' if self.side_combo.currentText() == 'Buy' else 'sell'
         volatility_sens = self.volatility_slider.value() / 100
-        
-        metrics = self.simulator_callback(quantity, side, volatility_sens)
-        if not metrics:
+        self.simulator.set_params(quantity, side, volatility_sens)
+        
+    def setup_redraw_timer(self):
+        """Coalesce pushed metrics so widgets redraw at most _max_redraw_hz times a second"""
+        self._max_redraw_hz = 30
+        self._pending_metrics = None
+        self._redraw_timer = QTimer(self)
+        self._redraw_timer.setSingleShot(True)
+        self._redraw_timer.timeout.connect(self._flush_metrics)
+        
+    def update_metrics(self, snapshot):
+        """Keep the newest pushed UiSnapshot and schedule a redraw"""
+        self._pending_metrics = snapshot
+        # Nothing is drawn while minimized or hidden, changeEvent/showEvent flush on restore
+        if self.isMinimized() or not self.isVisible():
+            return
+        if not self._redraw_timer.isActive():
+            self._redraw_timer.start(1000 // self._max_redraw_hz)
+            
+    def _flush_metrics(self):
+        """Redraw with the newest snapshot received in the last interval"""
+        snapshot, self._pending_metrics = self._pending_metrics, None
+        self.render_metrics(snapshot)
+        
+    def render_metrics(self, snapshot):
+        """Update all displayed metrics from a preformatted UiSnapshot"""
+        if snapshot is None:
             return
             
         # Update price metrics
-        self.mid_price_label.setText(f"{metrics['mid_price']:,.2f} USDT")
+        self._set_text(self.mid_price_label, snapshot.mid_price_txt)
         
         # Update slippage with visual feedback
-        slippage = metrics['slippage']
-        self.slippage_label.setText(f"{slippage:.4f}%")
-        self.slippage_bar.setValue(int(slippage * 100))  # Convert % to 0.01% units
+        self._set_text(self.slippage_label, snapshot.slippage_txt)
+        self.slippage_bar.setValue(snapshot.slippage_bar)
         
         # Color slippage bar based on severity
-        palette = self.slippage_bar.palette()
-        if slippage > 0.5:
-            palette.setColor(QPalette.Highlight, QColor(255, 0, 0))
-        elif slippage > 0.1:
-            palette.setColor(QPalette.Highlight, QColor(255, 165, 0))
-        else:
-            palette.setColor(QPalette.Highlight, QColor(0, 255, 0))
-        self.slippage_bar.setPalette(palette)
+        if snapshot.slippage_bucket != self._last_slip_bucket:
+            self.slippage_bar.setPalette(self._palettes[snapshot.slippage_bucket])
+            self._last_slip_bucket = snapshot.slippage_bucket
         
         # Update cost metrics
-        self.fees_label.setText(f"{metrics['fees']:,.4f} USDT")
-        self.market_impact_label.setText(f"{metrics['market_impact']:.4f}%")
-        self.net_cost_label.setText(f"{metrics['net_cost']:,.4f} USDT")
+        self._set_text(self.fees_label, snapshot.fees_txt)
+        self._set_text(self.market_impact_label, snapshot.market_impact_txt)
+        self._set_text(self.net_cost_label, snapshot.net_cost_txt)
         
         # Update maker/taker visualization
-        maker_pct = metrics['maker_taker_proportion'][0] * 100
-        taker_pct = metrics['maker_taker_proportion'][1] * 100
-        self.maker_progress.setFormat(f"{maker_pct:.2f}%")
-        self.maker_progress.setValue(int(maker_pct))
-        self.taker_progress.setFormat(f"{taker_pct:.2f}%")
-        self.taker_progress.setValue(int(taker_pct))
+        self._set_format(self.maker_progress, snapshot.maker_txt)
+        self.maker_progress.setValue(snapshot.maker_bar)
+        self._set_format(self.taker_progress, snapshot.taker_txt)
+        self.taker_progress.setValue(snapshot.taker_bar)
         
         # Update performance metrics
-        self.latency_label.setText(f"{metrics['processing_time']:.2f} ms")
-        self.avg_processing_label.setText(f"{metrics['avg_processing_time']:.2f} ms")
-        update_freq = 1/metrics['update_frequency'] if metrics['update_frequency'] > 0 else 0
-        self.update_freq_label.setText(f"{update_freq:.2f} Hz")
-        self.orderbook_depth_label.setText(f"{metrics['orderbook_depth']}")
+        self._set_text(self.latency_label, snapshot.latency_txt)
+        self._set_text(self.avg_processing_label, snapshot.avg_processing_txt)
+        self._set_text(self.update_freq_label, snapshot.update_freq_txt)
+        self._set_num(self.orderbook_depth_label, snapshot.orderbook_depth)
+        
+    def _set_text(self, label, text):
+        """setText only when the string differs from what the label shows"""
+        if self._last_text.get(label) != text:
+            label.setText(text)
+            self._last_text[label] = text
+            
+    def _set_num(self, label, value):
+        """setNum an integer label, letting Qt format it, only when the value changes"""
+        if self._last_text.get(label) != value:
+            label.setNum(value)
+            self._last_text[label] = value
+            
+    def _set_format(self, bar, text):
+        """setFormat only when the string differs from what the bar shows"""
+        if self._last_text.get(bar) != text:
+            bar.setFormat(text)
+            self._last_text[bar] = text
+            
+    def changeEvent(self, event):
+        """Pause metrics pushes while minimized and redraw on restore"""
+        if event.type() == QEvent.WindowStateChange:
+            minimized = self.isMinimized()
+            self.simulator.set_paused(minimized)
+            if not minimized and self._pending_metrics is not None:
+                self._redraw_timer.start(0)
+        super().changeEvent(event)
+        
+    def showEvent(self, event):
+        """Redraw metrics that arrived while the window was hidden"""
+        super().showEvent(event)
+        if self._pending_metrics is not None and not self.isMinimized():
+            self._redraw_timer.start(0)
         
     def closeEvent(self, event):
-        self.timer.stop()
+        self._redraw_timer.stop()
+        self._param_debounce.stop()
         event.accept()
\ No newline at end of file
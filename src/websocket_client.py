@@ -1,21 +1,37 @@
-import json
-import websocket
+import asyncio
+import random
+import websockets
 import threading
-import time
+from collections import deque
 from queue import Queue
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                             QLabel, QLineEdit, QComboBox, QPushButton, QDoubleSpinBox,
                             QFormLayout, QGroupBox, QSlider, QProgressBar)
-from PyQt5.QtCore import Qt, QTimer, QObject, pyqtSignal
+from PyQt5.QtCore import Qt, QTimer, QObject, QThread, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QColor, QPalette
 import sys
 from utils import logger
 
+try:
+    import uvloop  # Not available on Windows
+except ImportError:
+    uvloop = None
+
+MAX_MESSAGE_SIZE = 2 ** 20
+MAX_RECONNECT_DELAY = 60  # seconds, ceiling for exponential backoff
+
+# This would be replaced with actual WebSocket URLs for each exchange
+_WS_URL_TEMPLATES = {
+    'OKX': "wss://ws.okx.com:8443/ws/v5/public?symbol={symbol}",
+    'Binance': "wss://stream.binance.com:9443/ws/{symbol}@depth",
+    'Coinbase': "wss://ws-feed.pro.coinbase.com"
+}
+
 class WebSocketClient(QObject):
     """
-    WebSocket client that runs in a separate thread and emits signals when messages are received
+    WebSocket client that runs an asyncio loop in a separate thread and signals when queued messages are ready
     """
-    message_received = pyqtSignal(dict)
+    batch_ready = pyqtSignal()
     connection_changed = pyqtSignal(bool)
     
     def __init__(self, url):
@@ -26,6 +42,11 @@ class WebSocketClient(QObject):
         self.keep_running = True
         self.message_drop_count = 0
         self.max_queue_size = 1000
+        self._queue = deque(maxlen=self.max_queue_size)
+        self._notified = False
+        self._loop = None
+        self._task = None
+        self._loop_lock = threading.Lock()  # Publishes _loop and _task together to disconnect()
         self.reconnect_attempts = 0
         self.max_reconnect_attempts = 5
         
@@ -36,11 +57,14 @@ class WebSocketClient(QObject):
         self.connection_changed.emit(True)
         
     def on_message(self, ws, message):
-        try:
-            data = json.loads(message)
-            self.message_received.emit(data)
-        except json.JSONDecodeError as e:
-            logger.error(f"Error decoding message: {e}")
+        # Queue the raw payload, the consumer decodes only the snapshot it keeps
+        if len(self._queue) == self.max_queue_size:
+            self.message_drop_count += 1  # deque drops the oldest on append
+        self._queue.append(message)
+        # Only one batch_ready is in flight until the receiver drains
+        if not self._notified:
+            self._notified = True
+            self.batch_ready.emit()
             
     def on_error(self, ws, error):
         logger.error(f"WebSocket error: {error}")
@@ -51,37 +75,118 @@ class WebSocketClient(QObject):
         self.connected = False
         self.connection_changed.emit(False)
         
-        if self.keep_running and self.reconnect_attempts < self.max_reconnect_attempts:
-            self.reconnect_attempts += 1
-            logger.info(f"Attempting to reconnect ({self.reconnect_attempts}/{self.max_reconnect_attempts})...")
-            time.sleep(5)
-            self.connect()
+    def should_reconnect(self):
+        """Count a reconnect attempt, False once retries are exhausted"""
+        if not self.keep_running or self.reconnect_attempts >= self.max_reconnect_attempts:
+            return False
+        self.reconnect_attempts += 1
+        logger.info(f"Attempting to reconnect ({self.reconnect_attempts}/{self.max_reconnect_attempts})...")
+        return True
+        
+    async def _listen(self):
+        """Receive messages until the connection closes"""
+        async with websockets.connect(self.url, compression=None, max_size=MAX_MESSAGE_SIZE) as ws:
+            self.ws = ws
+            if not self.keep_running:
+                return  # disconnect() arrived during the handshake
+            self.on_open(ws)
+            try:
+                async for message in ws:
+                    self.on_message(ws, message)
+            except websockets.ConnectionClosed:
+                pass
+            finally:
+                # Also runs when disconnect() cancels the task
+                self.on_close(ws, ws.close_code, ws.close_reason)
+            
+    async def _run(self):
+        """Connect, and reconnect after drops while attempts remain"""
+        while self.keep_running:
+            try:
+                await self._listen()
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                self.connected = False
+                self.on_error(self.ws, e)
+            if not self.should_reconnect():
+                break
+            # 1, 2, 4, 8... seconds plus jitter so clients don't retry in lockstep
+            delay = min(MAX_RECONNECT_DELAY, 2 ** (self.reconnect_attempts - 1)) + random.random()
+            await asyncio.sleep(delay)
+            
+    def _run_loop(self):
+        loop = uvloop.new_event_loop() if uvloop is not None else asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        task = loop.create_task(self._run())
+        with self._loop_lock:
+            self._loop, self._task = loop, task
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.close()
             
     def connect(self):
-        self.ws = websocket.WebSocketApp(
-            self.url,
-            on_open=self.on_open,
-            on_message=self.on_message,
-            on_error=self.on_error,
-            on_close=self.on_close
-        )
-        
-        self.wst = threading.Thread(target=self.ws.run_forever)
+        self.wst = threading.Thread(target=self._run_loop)
         self.wst.daemon = True
         self.wst.start()
         
     def disconnect(self):
+        # Before the loop exists, _run sees keep_running and never connects
         self.keep_running = False
-        if self.ws:
-            self.ws.close()
+        with self._loop_lock:
+            loop, task = self._loop, self._task
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # Loop closed between the check and the call
             
     def is_connected(self):
         return self.connected
+        
+    def drain(self):
+        """Take every queued raw message, oldest first"""
+        # Reset before popping so a message appended meanwhile re-notifies
+        self._notified = False
+        messages = []
+        while self._queue:
+            messages.append(self._queue.popleft())
+        return messages
+
+class SimulatorWorker(QObject):
+    """
+    Runs the simulator callback on a worker thread and emits the resulting metrics
+    """
+    compute = pyqtSignal(float, str, float)
+    result = pyqtSignal(dict)
+    
+    def __init__(self, simulator_callback):
+        super().__init__()
+        self.simulator_callback = simulator_callback
+        self.compute.connect(self._do)
+        
+    @pyqtSlot(float, str, float)
+    def _do(self, quantity, side, volatility_sens):
+        metrics = self.simulator_callback(quantity, side, volatility_sens)
+        # Copy: TradeSimulator reuses its metrics dict and the GUI thread reads this later
+        self.result.emit(dict(metrics) if metrics else {})
 
 class TradeSimulatorUI(QMainWindow):
     def __init__(self, simulator_callback):
         super().__init__()
         self.simulator_callback = simulator_callback
+        # Metrics are computed on a worker thread so the event loop never waits on the simulator
+        self._sim_thread = QThread(self)
+        self._worker = SimulatorWorker(simulator_callback)
+        self._worker.moveToThread(self._sim_thread)
+        self._worker.result.connect(self.update_metrics)
+        self._compute_pending = False
+        self._sim_thread.start()
+        # Debounce exchange switches so a burst of changes reconnects once
+        self._reconnect_timer = QTimer(self)
+        self._reconnect_timer.setSingleShot(True)
+        self._reconnect_timer.timeout.connect(self.reconnect_websocket)
         self.init_ui()
         self.setup_timer()
         self.setup_websocket()
@@ -201,6 +306,11 @@ class TradeSimulatorUI(QMainWindow):
         """Handle exchange selection change"""
         # Here you would update the WebSocket URL based on the selected exchange
         logger.info(f"Exchange changed to {exchange}")
+        self._reconnect_timer.start(200)  # Restarting resets the delay
+        
+    def reconnect_websocket(self):
+        """Replace the WebSocket client for the current exchange selection"""
+        # disconnect() only schedules the close on the client's loop, so this never blocks the GUI
         if self.ws_client:
             self.ws_client.disconnect()
             self.setup_websocket()
@@ -219,22 +329,21 @@ class TradeSimulatorUI(QMainWindow):
         exchange = self.exchange_combo.currentText()
         symbol = self.symbol_combo.currentText()
         
-        # This would be replaced with actual WebSocket URLs for each exchange
-        ws_urls = {
-            'OKX': f"wss://ws.okx.com:8443/ws/v5/public?symbol={symbol}",
-            'Binance': f"wss://stream.binance.com:9443/ws/{symbol.lower()}@depth",
-            'Coinbase': f"wss://ws-feed.pro.coinbase.com"
-        }
+        if exchange == 'Binance':
+            symbol = symbol.lower()
+        url = _WS_URL_TEMPLATES.get(exchange, _WS_URL_TEMPLATES['OKX']).format(symbol=symbol)
         
-        self.ws_client = WebSocketClient(ws_urls.get(exchange, ws_urls['OKX']))
-        self.ws_client.message_received.connect(self.handle_ws_message)
+        self.ws_client = WebSocketClient(url)
+        self.ws_client.batch_ready.connect(self.handle_ws_batch)
         self.ws_client.connection_changed.connect(self.update_connection_status)
         self.ws_client.connect()
         
-    def handle_ws_message(self, message):
-        """Handle incoming WebSocket messages"""
-        # Process the order book update
-        self.simulator_callback(message)  # Pass the message to the simulator
+    def handle_ws_batch(self):
+        """Handle a batch of incoming WebSocket messages"""
+        # Each message is a full book snapshot, only the newest matters
+        messages = self.ws_client.drain()
+        if messages:
+            self.simulator_callback(messages[-1])  # Pass the message to the simulator
         
     def update_connection_status(self, connected):
         """Update UI based on connection status"""
@@ -247,16 +356,23 @@ class TradeSimulatorUI(QMainWindow):
     
     def setup_timer(self):
         self.timer = QTimer()
-        self.timer.timeout.connect(self.update_metrics)
+        self.timer.timeout.connect(self.request_metrics)
         self.timer.start(500)  # Update every 500ms
         
-    def update_metrics(self):
-        """Update all displayed metrics"""
+    def request_metrics(self):
+        """Ask the worker for metrics with the current order parameters"""
+        # Skip the tick if the previous computation hasn't come back yet
+        if self._compute_pending:
+            return
+        self._compute_pending = True
         quantity = self.quantity_input.value()
         side = 'buy' if self.side_combo.currentText() == 'Buy' else 'sell'
         volatility_sens = self.volatility_slider.value() / 100
+        self._worker.compute.emit(quantity, side, volatility_sens)
         
-        metrics = self.simulator_callback(quantity, side, volatility_sens)
+    def update_metrics(self, metrics):
+        """Update all displayed metrics"""
+        self._compute_pending = False
         if not metrics:
             return
             
@@ -301,6 +417,9 @@ class TradeSimulatorUI(QMainWindow):
     def closeEvent(self, event):
         """Clean up resources when closing the window"""
         self.timer.stop()
+        self._reconnect_timer.stop()
+        self._sim_thread.quit()
+        self._sim_thread.wait()
         if hasattr(self, 'ws_client'):
             self.ws_client.disconnect()
         event.accept()